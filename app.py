@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
+import io
 import math
+import numpy as np
 from datetime import datetime, timedelta
 
+from comparables import ComparablesIndex
+from goal_seek import DEFAULT_CONSTRAINTS, TOLERANCE, goal_seek
+from jobs import FINISHED, JobQueue
+from quotes import ADDED_QUOTES_PATH, append_quotes, load_added_quotes, load_quotes, quote_record
+from validation import flagged_report, percentile_bands, screen_quotes
+
 # Page configuration
 st.set_page_config(
     page_title="DC Power Studies Cost Estimator",
@@ -11,6 +19,46 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Quote history is cached per uploaded file so reruns don't re-parse or re-screen it.
+# Cached calls are keyed on the upload's file_id; the file itself (leading
+# underscore) is never hashed. The loaded frame is shared and read-only.
+# Every re-upload gets a new file_id, so the archive caches keep only the
+# last few uploads.
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_quote_history(file_id, _history_file):
+    return load_quotes(io.BytesIO(_history_file.getvalue()))
+
+# Quotes added from the dashboard join the uploaded archive for bands and comparables
+def added_quotes_version():
+    return ADDED_QUOTES_PATH.stat().st_mtime_ns if ADDED_QUOTES_PATH.exists() else 0
+
+def archive_with_additions(file_id, history_file):
+    history = load_quote_history(file_id, history_file)
+    added = load_added_quotes()
+    return history if added is None else pd.concat([history, added], ignore_index=True)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def quote_history_bands(file_id, additions_version, _history_file):
+    return percentile_bands(archive_with_additions(file_id, _history_file))
+
+@st.cache_data(show_spinner="Screening quote history...")
+def screen_quote_history(file_id, _history_file):
+    history = load_quote_history(file_id, _history_file)
+    return screen_quotes(history, history)
+
+# Archives larger than this are screened as a background job
+INLINE_SCREEN_ROWS = 200_000
+
+# Single job queue per server; jobs and results persist in .jobs/
+@st.cache_resource
+def job_queue():
+    return JobQueue()
+
+# One k-NN index per archive, shared across reruns and sessions
+@st.cache_resource(show_spinner="Indexing quote history...", max_entries=4)
+def comparables_index(file_id, _history_file):
+    return ComparablesIndex(archive_with_additions(file_id, _history_file))
+
 # Advanced CSS for Professional Dark Theme
 st.markdown("""
 <style>
@@ -438,6 +486,21 @@ with st.expander("🔧 Calibration Controls", expanded=False):
         if st.button("Reset to Defaults", type="secondary"):
             st.experimental_rerun()
 
+# Quote History (used for validation percentile bands)
+with st.expander("📂 Quote History", expanded=False):
+    st.markdown("Upload an archive of past quotes (CSV, one row per quote) to screen it and to compare new estimates against it.")
+    history_file = st.file_uploader("Quote archive CSV", type=["csv"], key="quote_history")
+    history_id = history_file.file_id if history_file is not None else None
+    quote_history = history_bands = None
+    if history_id is not None:
+        try:
+            quote_history = load_quote_history(history_id, history_file)
+            history_bands = quote_history_bands(history_id, added_quotes_version(), history_file)
+            st.caption(f"{len(quote_history):,} archived quotes loaded")
+        except ValueError as exc:
+            st.error(f"⚠️ {exc}")
+            history_id = None
+
 # Bus Count and Studies Section
 col_left, col_right = st.columns([1, 1])
 
@@ -576,6 +639,15 @@ report_cost = 15000 * REPORT_MULTIPLIERS[report_format]
 subtotal = total_study_cost + total_meeting_cost + report_cost
 total_cost = subtotal * (1 + custom_margin/100)
 
+current_quote = quote_record(
+    project_name=project_name, it_capacity=it_capacity, mechanical_load=mechanical_load,
+    house_load=house_load, total_load=total_load, tier_level=tier_level,
+    estimated_buses=estimated_buses, **studies_selected,
+    senior_allocation=senior_allocation, mid_allocation=mid_allocation,
+    junior_allocation=junior_allocation, delivery_type=delivery_type,
+    custom_margin=custom_margin, total_study_hours=total_study_hours, total_cost=total_cost
+)
+
 # Results Section
 st.markdown("""
 <div class="section-header">
@@ -712,9 +784,227 @@ if study_results:
     </div>
     """, unsafe_allow_html=True)
 
+    # Comparable past projects from the quote archive
+    st.markdown("""
+    <div class="section-header">
+        <h2>🏗️ Comparable Projects</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if history_id is not None:
+        index = comparables_index(history_id, history_file)
+        comparables = index.query(current_quote, k=10)
+
+        with_actuals = comparables['actual_cost'].notna()
+        if with_actuals.any():
+            median_variance = comparables.loc[with_actuals, 'cost_variance'].median()
+            st.markdown(f"Of the {int(with_actuals.sum())} comparables with actual costs recorded, "
+                        f"the median project came in at **{median_variance:+.1%}** against its quote.")
+
+        st.dataframe(
+            comparables[['project_name', 'tier_level', 'total_load', 'estimated_buses',
+                         'total_cost', 'actual_cost', 'cost_variance', 'distance']].rename(columns={
+                'project_name': 'Project', 'tier_level': 'Tier', 'total_load': 'Load (MW)',
+                'estimated_buses': 'Buses', 'total_cost': 'Quoted (₹)', 'actual_cost': 'Actual (₹)',
+                'cost_variance': 'Variance', 'distance': 'Distance'
+            }).style.format({'Load (MW)': '{:.1f}', 'Quoted (₹)': '₹{:,.0f}', 'Actual (₹)': '₹{:,.0f}',
+                             'Variance': '{:+.1%}', 'Distance': '{:.2f}'}, na_rep='—'),
+            use_container_width=True
+        )
+
+        if index.skipped:
+            st.caption(f"{index.skipped:,} archived quotes with blank or invalid load, bus or capacity "
+                       "figures are left out of comparables.")
+        st.caption(f"Added quotes are saved to {ADDED_QUOTES_PATH.parent.name}/{ADDED_QUOTES_PATH.name} "
+                   "and used for comparables and validation bands alongside the uploaded archive.")
+        if st.button("Add This Quote to Archive", key="add_to_archive"):
+            if project_name in index:
+                st.warning(f"⚠️ A quote for '{project_name}' is already in the archive. Rename the project to add another.")
+            else:
+                index.add(current_quote)
+                append_quotes(current_quote)
+                st.success(f"✅ Added to archive ({len(index):,} quotes indexed)")
+    else:
+        st.info("Upload a quote archive under 📂 Quote History to see the 10 most similar past projects.")
+
+    # Validation Warnings for the current quote
+    current_flags = screen_quotes(current_quote, bands=history_bands).iloc[0]
+
+    st.markdown("""
+    <div class="section-header">
+        <h2>🚨 Validation Warnings</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if current_flags['flag_count']:
+        for message in current_flags['flag_summary'].split("; "):
+            st.warning(f"⚠️ {message}")
+    else:
+        st.success("✅ Estimate is within all validation thresholds")
+
+    st.download_button(
+        "Download Quote Record (CSV)",
+        current_quote.to_csv(index=False),
+        file_name=f"{project_name}_quote.csv",
+        mime="text/csv"
+    )
+
 else:
     st.warning("⚠️ No studies selected. Please select at least one study type from the sidebar.")
 
+# Goal Seek: settings that hit a target price (also with no studies selected,
+# since optional studies can add scope)
+with st.expander("🎯 Goal Seek", expanded=False):
+    st.markdown("Find margin, resource allocation, complexity factors and study scope that price the project at a target cost.")
+
+    gs_col1, gs_col2 = st.columns(2)
+    with gs_col1:
+        target_cost = st.number_input("Target Total Cost (₹)", min_value=10000, value=int(round(total_cost, -3)), step=10000)
+        margin_range = st.slider("Margin Range (%)", *DEFAULT_CONSTRAINTS['margin'], DEFAULT_CONSTRAINTS['margin'], 1)
+        factor_range = st.slider("Complexity Factor Range", *DEFAULT_CONSTRAINTS['factor'], DEFAULT_CONSTRAINTS['factor'], 0.1)
+        study_names = {key: data['name'] for key, data in STUDIES_DATA.items()}
+        required_studies = st.multiselect("Studies that must be included", list(study_names), format_func=study_names.get,
+                                          default=[key for key, chosen in studies_selected.items() if chosen])
+        optional_studies = st.multiselect("Studies that may be added or dropped", list(study_names), format_func=study_names.get)
+    with gs_col2:
+        allocation_ranges = {
+            grade: st.slider(f"{label} % Range", *DEFAULT_CONSTRAINTS['allocation'][grade], DEFAULT_CONSTRAINTS['allocation'][grade], 1)
+            for grade, label in (('senior', "Senior Engineer"), ('mid', "Mid-level Engineer"), ('junior', "Junior Engineer"))
+        }
+
+    goal_seek_inputs = dict(
+        pricing={
+            'estimated_buses': estimated_buses,
+            'tier_complexity': tier_complexity,
+            'base_hours': {key: data['base_hours_per_bus'] for key, data in STUDIES_DATA.items()},
+            'rates': {'senior': senior_rate, 'mid': mid_rate, 'junior': junior_rate},
+            'rate_multiplier': urgency_multiplier if delivery_type == "Urgent" else 1.0,
+            'fixed_cost': total_meeting_cost + report_cost,
+        },
+        current={
+            'margin': custom_margin,
+            'allocation': {'senior': senior_allocation * 100, 'mid': mid_allocation * 100, 'junior': junior_allocation * 100},
+            'factors': {key: data['factor'] for key, data in STUDIES_DATA.items()},
+            'studies': studies_selected,
+        },
+        constraints={
+            'margin': margin_range,
+            'factor': factor_range,
+            'allocation': allocation_ranges,
+            'required': required_studies,
+            'optional': optional_studies,
+        }
+    )
+
+    gs_find, gs_sweep = st.columns(2)
+    with gs_sweep:
+        if st.button("Sweep ±30% in Background", key="price_ladder"):
+            targets = [round(target_cost * (1 + step), -3) for step in np.arange(-0.30, 0.301, 0.05)]
+            job_queue().submit('price_ladder', {**goal_seek_inputs, 'targets': targets, 'top_n': 3},
+                               label=f"{project_name}: price ladder around ₹{target_cost:,.0f}")
+            st.success("✅ Submitted. Track it under 🧵 Background Jobs.")
+
+    with gs_find:
+        find_settings = st.button("Find Settings", key="goal_seek")
+
+    if find_settings:
+        options = goal_seek(target_cost, **goal_seek_inputs)
+
+        if options.empty:
+            st.warning("⚠️ No study set allowed. Select at least one study to include or vary.")
+        else:
+            if options['gap'].abs().min() > TOLERANCE:
+                st.warning("⚠️ Target not reachable within these constraints. Showing the closest settings.")
+            options['studies'] = options['studies'].map(lambda keys: ", ".join(study_names[key] for key in keys))
+            factor_columns = [f'{key}_factor' for key in STUDIES_DATA if f'{key}_factor' in options]
+            st.dataframe(
+                options[['studies', 'custom_margin', 'senior_allocation', 'mid_allocation', 'junior_allocation',
+                         *factor_columns, 'total_cost', 'gap']].rename(columns={
+                    'studies': 'Studies', 'custom_margin': 'Margin (%)', 'senior_allocation': 'Senior %',
+                    'mid_allocation': 'Mid %', 'junior_allocation': 'Junior %', 'total_cost': 'Total (₹)', 'gap': 'Gap',
+                    **{f'{key}_factor': f"{data['name']} Factor" for key, data in STUDIES_DATA.items()}
+                }).style.format({'Senior %': '{:.0f}', 'Mid %': '{:.0f}', 'Junior %': '{:.0f}',
+                                 'Total (₹)': '₹{:,.0f}', 'Gap': '{:+.2%}',
+                                 **{f"{data['name']} Factor": '{:.2f}' for data in STUDIES_DATA.values()}}, na_rep='—'),
+                use_container_width=True
+            )
+
+# Portfolio screening of the uploaded quote history
+if history_id is not None:
+    st.markdown("""
+    <div class="section-header">
+        <h2>🔎 Quote History Screening</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if len(quote_history) > INLINE_SCREEN_ROWS:
+        st.info(f"{len(quote_history):,} quotes is too many to screen on every rerun. Run it as a background job instead.")
+        if st.button("Screen in Background", key="screen_portfolio"):
+            job_queue().submit('screen_portfolio', {'quote_bytes': history_file.getvalue()},
+                               label=f"Screen {history_file.name} ({len(quote_history):,} quotes)")
+            st.success("✅ Submitted. Track it under 🧵 Background Jobs.")
+    else:
+        history_flags = screen_quote_history(history_id, history_file)
+        flagged = history_flags['flag_count'] > 0
+        st.markdown(f"**{int(flagged.sum()):,}** of **{len(history_flags):,}** archived quotes flagged")
+
+        if flagged.any():
+            flagged_quotes = flagged_report(quote_history, history_flags)
+            st.dataframe(flagged_quotes.head(1000), use_container_width=True)
+            st.download_button(
+                "Download Flagged Quotes (CSV)",
+                flagged_quotes.to_csv(index=False),
+                file_name="flagged_quotes.csv",
+                mime="text/csv"
+            )
+
+# Background Jobs
+queue = job_queue()
+job_list = queue.jobs()
+if not job_list.empty:
+    st.markdown("""
+    <div class="section-header">
+        <h2>🧵 Background Jobs</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col_refresh, col_clear, _ = st.columns([1, 1, 4])
+    with col_refresh:
+        st.button("Refresh", key="jobs_refresh")
+    with col_clear:
+        if st.button("Clear Finished", key="jobs_clear"):
+            queue.clear_finished()
+            st.session_state.pop('job_view', None)
+            st.rerun()
+
+    for job in job_list.itertuples():
+        col_job, col_progress, col_action = st.columns([3, 3, 1])
+        with col_job:
+            st.markdown(f"**{job.label}**<br><small>{job.status.title()} • {job.message}</small>", unsafe_allow_html=True)
+        with col_progress:
+            st.progress(min(max(job.progress, 0.0), 1.0))
+        with col_action:
+            if job.status not in FINISHED:
+                if st.button("Cancel", key=f"cancel_{job.id}"):
+                    queue.cancel(job.id)
+                    st.rerun()
+            elif job.status == 'done':
+                if st.button("View", key=f"view_{job.id}"):
+                    st.session_state['job_view'] = job.id
+
+    job_view = st.session_state.get('job_view')
+    if job_view in set(job_list['id']):
+        result = queue.result(job_view)
+        if result is not None:
+            st.markdown(f"#### {job_list.set_index('id').at[job_view, 'label']}")
+            st.dataframe(result.head(1000), use_container_width=True)
+            st.download_button(
+                "Download Job Result (CSV)",
+                result.to_csv(index=False),
+                file_name=f"job_{job_view}.csv",
+                mime="text/csv"
+            )
+
 # Footer
 st.markdown("""
 <div style="text-align: center; color: #64748b; padding: 2rem; margin-top: 3rem; border-top: 1px solid rgba(100, 116, 139, 0.2);">
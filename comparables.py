@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from quotes import STUDY_KEYS, TIER_LEVELS
+
+# Relative importance of each feature after normalization
+FEATURE_WEIGHTS = {
+    'log_total_load': 2.0,
+    'it_share': 1.0,
+    'mechanical_share': 1.0,
+    'house_share': 1.0,
+    'tier': 1.5,
+    'log_buses': 2.0,
+    **{key: 0.5 for key in STUDY_KEYS},
+}
+
+# Rebuild the tree once un-indexed additions reach this share of the archive
+REBUILD_FRACTION = 0.1
+
+
+def quote_features(quotes):
+    # Raw (un-normalized) feature matrix, one row per quote
+    total_load = quotes['total_load'].to_numpy(dtype=float)
+    loads = quotes[['it_capacity', 'mechanical_load', 'house_load']].to_numpy(dtype=float)
+    # Zero load gives zero shares; blank loads stay NaN so the quote is skipped
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(total_load[:, None] > 0, loads / total_load[:, None], 0.0)
+    return np.column_stack([
+        np.log1p(total_load),
+        shares,
+        quotes['tier_level'].map(TIER_LEVELS).to_numpy(dtype=float),
+        np.log1p(quotes['estimated_buses'].to_numpy(dtype=float)),
+        quotes[STUDY_KEYS].to_numpy(dtype=float),
+    ])
+
+
+class ComparablesIndex:
+    # k-NN index over archived quotes. New quotes are searched by brute force
+    # until they grow past REBUILD_FRACTION of the archive, then folded into a
+    # fresh tree, so adding a quote never pays for a full rebuild. One index
+    # is shared by every dashboard session, so all access holds _lock.
+    # Quotes with blank or invalid features can't be placed in the tree and
+    # are left out; `skipped` counts them.
+
+    def __init__(self, quotes):
+        self._lock = threading.Lock()
+        usable = np.isfinite(quote_features(quotes)).all(axis=1)
+        self.skipped = int((~usable).sum())
+        self._indexed = quotes[usable].reset_index(drop=True)
+        self._pending = self._indexed.iloc[:0]
+        self._pending_points = np.empty((0, len(FEATURE_WEIGHTS)))
+        self._build()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._indexed) + len(self._pending_points)
+
+    def __contains__(self, project_name):
+        with self._lock:
+            return project_name in self._names
+
+    def _build(self):
+        features = quote_features(self._indexed)
+        self._center = features.mean(axis=0) if len(features) else np.zeros(features.shape[1])
+        scale = features.std(axis=0) if len(features) else np.ones(features.shape[1])
+        scale[scale == 0] = 1.0
+        self._scale = scale / np.array(list(FEATURE_WEIGHTS.values()))
+        self._tree = cKDTree(self._normalize(features), balanced_tree=False, compact_nodes=False)
+        self._indexed_names = self._indexed['project_name'].to_numpy(dtype=object)
+        self._names = set(self._indexed_names)
+
+    def _normalize(self, features):
+        return (features - self._center) / self._scale
+
+    def add(self, quotes):
+        features = quote_features(quotes)
+        usable = np.isfinite(features).all(axis=1)
+        with self._lock:
+            self.skipped += int((~usable).sum())
+            quotes = quotes[usable]
+            self._pending = pd.concat([self._pending, quotes], ignore_index=True)
+            self._pending_points = np.vstack([self._pending_points, self._normalize(features[usable])])
+            self._names.update(quotes['project_name'])
+            if len(self._pending_points) > REBUILD_FRACTION * max(len(self._indexed), 1):
+                self._rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._indexed = pd.concat([self._indexed, self._pending], ignore_index=True)
+        self._pending = self._indexed.iloc[:0]
+        self._pending_points = np.empty((0, len(FEATURE_WEIGHTS)))
+        self._build()
+
+    def query(self, quote, k=10):
+        # The k archived quotes nearest to `quote` (a single-row frame),
+        # closest first, with their distance and actual-vs-quoted variance.
+        # Archived quotes for the same project name are left out, so a quote
+        # that has been added to the archive is never its own comparable.
+        with self._lock:
+            return self._query(quote, k)
+
+    def _query(self, quote, k):
+        point = self._normalize(quote_features(quote))[0]
+        name = quote['project_name'].iloc[0]
+
+        # Widen the tree search until k neighbours survive the name filter
+        distances, rows = np.empty(0), np.empty(0, dtype=int)
+        k_tree = min(k, len(self._indexed))
+        while k_tree:
+            distances, rows = self._tree.query(point, k=k_tree)
+            distances, rows = np.atleast_1d(distances), np.atleast_1d(rows)
+            other = self._indexed_names[rows] != name
+            if other.sum() >= k or k_tree == len(self._indexed):
+                distances, rows = distances[other], rows[other]
+                break
+            k_tree = min(k_tree * 4, len(self._indexed))
+
+        matches = self._indexed.iloc[rows]
+        if len(self._pending_points):
+            pending_distances = np.linalg.norm(self._pending_points - point, axis=1)
+            pending_distances[self._pending['project_name'].to_numpy(dtype=object) == name] = np.inf
+            nearest = np.argsort(pending_distances)[:k]
+            nearest = nearest[np.isfinite(pending_distances[nearest])]
+            distances = np.concatenate([distances, pending_distances[nearest]])
+            matches = pd.concat([matches, self._pending.iloc[nearest]], ignore_index=True)
+
+        order = np.argsort(distances, kind='stable')[:k]
+        comparables = matches.iloc[order].reset_index(drop=True)
+        comparables['distance'] = distances[order]
+        comparables['cost_variance'] = (comparables['actual_cost'] - comparables['total_cost']) / comparables['total_cost']
+        return comparables
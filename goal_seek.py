@@ -0,0 +1,120 @@
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+# Slider limits from the dashboard; goal seek never leaves these
+DEFAULT_CONSTRAINTS = {
+    'margin': (0, 30),
+    'allocation': {'senior': (10, 40), 'mid': (20, 50), 'junior': (30, 70)},
+    'factor': (0.5, 2.0),
+}
+
+ALLOCATION_STEP = 5     # % points between candidate allocations
+FACTOR_STEP = 0.2       # between candidate complexity factors
+SLIDER_STEP = 0.1       # complexity factor sliders only take multiples of this
+TOLERANCE = 0.01        # options within 1% of target count as hitting it
+
+
+def _grid(low, high, step):
+    return np.round(np.arange(low, high + step / 2, step), 4)
+
+
+def _factor_grid(low, high, current):
+    # Complexity factors the sliders can actually be set to: every FACTOR_STEP
+    # on the slider lattice, plus both range ends and the current factors
+    ticks = np.arange(math.ceil(low / SLIDER_STEP - 1e-9), math.floor(high / SLIDER_STEP + 1e-9) + 1)
+    if not len(ticks):
+        raise ValueError("Complexity factor range contains no slider setting")
+    current = np.round(np.asarray(current, dtype=float) / SLIDER_STEP)
+    keep = ((ticks % round(FACTOR_STEP / SLIDER_STEP) == 0) | (ticks == ticks[0]) | (ticks == ticks[-1])
+            | np.isin(ticks, current))
+    return np.round(ticks[keep] * SLIDER_STEP, 4)
+
+
+def goal_seek(target_cost, pricing, current, constraints=None, top_n=10):
+    # Search studies, complexity factors, resource allocation and margin for
+    # settings that price at target_cost. Margin is solved for directly on
+    # each candidate, everything else is a grid evaluated a study set at a time.
+    #   pricing:  estimated_buses, tier_complexity, base_hours, rates,
+    #             rate_multiplier, fixed_cost (meetings + report)
+    #   current:  margin, allocation (%), factors, studies (bool per study)
+    #   constraints: margin/allocation/factor ranges as DEFAULT_CONSTRAINTS, plus
+    #             'required' studies (default: those currently selected) and
+    #             'optional' studies that may be added or dropped
+    constraints = {**DEFAULT_CONSTRAINTS, **(constraints or {})}
+    margin_low, margin_high = constraints['margin']
+    selected = [key for key, chosen in current['studies'].items() if chosen]
+    required = [key for key in pricing['base_hours'] if key in constraints.get('required', selected)]
+    optional = [key for key in pricing['base_hours'] if key in constraints.get('optional', ()) and key not in required]
+    if target_cost <= 0:
+        raise ValueError("Target cost must be positive")
+
+    # Resource allocation candidates, normalized like the dashboard sliders.
+    # Slider settings with the same shares (10/20/30 and 20/40/60) price the
+    # same, so only the first of each is kept.
+    ranges = constraints['allocation']
+    allocation = np.array(list(itertools.product(*(
+        _grid(*ranges[grade], ALLOCATION_STEP) for grade in ('senior', 'mid', 'junior')
+    ))), dtype=float)
+    shares = allocation / allocation.sum(axis=1, keepdims=True)
+    _, distinct = np.unique(np.round(shares, 6), axis=0, return_index=True)
+    distinct = np.sort(distinct)
+    allocation, shares = allocation[distinct], shares[distinct]
+    rates = np.array([pricing['rates'][grade] for grade in ('senior', 'mid', 'junior')], dtype=float)
+    blended_rates = shares @ rates
+
+    # Change is measured on shares, so raw or normalized current values compare alike
+    current_allocation = np.array([current['allocation'][grade] for grade in ('senior', 'mid', 'junior')], dtype=float)
+    current_shares = current_allocation / current_allocation.sum()
+    allocation_change = np.abs(shares - current_shares).sum(axis=1)
+
+    factor_values = _factor_grid(*constraints['factor'], list(current['factors'].values()))
+    hours_per_factor = pricing['estimated_buses'] * pricing['tier_complexity']
+
+    best = []
+    for included in itertools.product((False, True), repeat=len(optional)):
+        studies = required + [key for key, keep in zip(optional, included) if keep]
+        if not studies:
+            continue
+
+        factors = np.array(list(itertools.product(factor_values, repeat=len(studies))))
+        base = np.array([pricing['base_hours'][key] for key in studies])
+        study_hours = hours_per_factor * factors @ base
+
+        # Margin that lands each candidate on target, held to whole % and the allowed range
+        subtotal = study_hours[:, None] * blended_rates[None, :] * pricing['rate_multiplier'] + pricing['fixed_cost']
+        margins = np.clip(np.round((target_cost / subtotal - 1) * 100), margin_low, margin_high)
+        totals = subtotal * (1 + margins / 100)
+        gap = np.abs(totals - target_cost) / target_cost
+
+        # Among candidates on target, prefer the fewest changes from the current settings
+        current_factors = np.array([current['factors'][key] for key in studies])
+        study_changes = sum(current['studies'].get(key, False) != (key in studies) for key in pricing['base_hours'])
+        change = (np.abs(factors - current_factors).sum(axis=1)[:, None]
+                  + allocation_change[None, :]
+                  + np.abs(margins - current['margin']) / 30
+                  + study_changes)
+        score = np.where(gap <= TOLERANCE, change, 1e6 + gap).ravel()
+
+        keep = np.argpartition(score, min(top_n, score.size) - 1)[:top_n]
+        factor_rows, allocation_rows = np.unravel_index(keep, subtotal.shape)
+        for flat, f_row, a_row in zip(keep, factor_rows, allocation_rows):
+            best.append({
+                'score': score[flat],
+                'studies': tuple(studies),
+                'custom_margin': int(margins[f_row, a_row]),
+                'senior_allocation': allocation[a_row, 0],
+                'mid_allocation': allocation[a_row, 1],
+                'junior_allocation': allocation[a_row, 2],
+                **{f'{key}_factor': value for key, value in zip(studies, factors[f_row])},
+                'total_cost': totals[f_row, a_row],
+                'gap': (totals[f_row, a_row] - target_cost) / target_cost,
+            })
+
+    options = pd.DataFrame(best)
+    if options.empty:
+        return options
+    options = options.sort_values('score', kind='stable').head(top_n).drop(columns='score')
+    return options.reset_index(drop=True)
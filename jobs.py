@@ -0,0 +1,270 @@
+import atexit
+import io
+import os
+import pickle
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from goal_seek import goal_seek
+from quotes import load_quotes
+from validation import flagged_report, percentile_bands, screen_quotes
+
+JOBS_DIR = Path(__file__).parent / ".jobs"
+MAX_WORKERS = 2
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 2
+HEARTBEAT_TIMEOUT = 15   # a worker silent this long is treated as dead
+SCREEN_CHUNK_ROWS = 100_000
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    worker_pid INTEGER
+);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Job functions run in worker processes: payload in, result out.
+# report(fraction, message) records progress and raises JobCancelled once
+# cancellation has been requested.
+
+def screen_portfolio(payload, report):
+    quotes = load_quotes(io.BytesIO(payload['quote_bytes']))
+    report(0.05, f"Loaded {len(quotes):,} quotes")
+    bands = percentile_bands(quotes)
+
+    chunks = []
+    for start in range(0, len(quotes), SCREEN_CHUNK_ROWS):
+        chunk = quotes.iloc[start:start + SCREEN_CHUNK_ROWS]
+        chunks.append(flagged_report(chunk, screen_quotes(chunk, quotes, bands=bands)))
+        done = min(start + SCREEN_CHUNK_ROWS, len(quotes))
+        report(0.05 + 0.95 * done / len(quotes), f"Screened {done:,} of {len(quotes):,} quotes")
+    return pd.concat(chunks).sort_values('flags', ascending=False, kind='stable')
+
+
+def price_ladder(payload, report):
+    targets = payload['targets']
+    options = []
+    for number, target in enumerate(targets, start=1):
+        found = goal_seek(target, payload['pricing'], payload['current'], payload['constraints'], top_n=payload['top_n'])
+        options.append(found.assign(target_cost=target))
+        report(number / len(targets), f"Solved {number} of {len(targets)} targets")
+    return pd.concat(options, ignore_index=True)
+
+
+JOB_KINDS = {
+    'screen_portfolio': screen_portfolio,
+    'price_ladder': price_ladder,
+}
+
+
+@contextmanager
+def _connect(root):
+    # Autocommit connection; every statement is its own transaction
+    connection = sqlite3.connect(Path(root) / "jobs.sqlite", timeout=30, isolation_level=None)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        yield connection
+    finally:
+        connection.close()
+
+
+def _claim_next(db):
+    # Oldest queued job, marked running inside one write transaction so two
+    # workers never pick up the same job
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        row = db.execute("SELECT id, kind FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row is not None:
+            db.execute("UPDATE jobs SET status = 'running', message = 'Running', worker_pid = ? WHERE id = ?", (os.getpid(), row[0]))
+    finally:
+        db.execute("COMMIT")
+    return row
+
+
+def _run_job(root, db, job_id, kind):
+    def report(fraction, message=""):
+        db.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (fraction, message, job_id))
+        cancel, = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if cancel:
+            raise JobCancelled()
+
+    try:
+        payload = pickle.loads((root / f"{job_id}.payload").read_bytes())
+        result = JOB_KINDS[kind](payload, report)
+        (root / f"{job_id}.result").write_bytes(pickle.dumps(result))
+        status, message = 'done', "Finished"
+    except JobCancelled:
+        status, message = 'cancelled', "Cancelled"
+    except Exception as exc:
+        status, message = 'failed', f"{type(exc).__name__}: {exc}"
+    finally:
+        (root / f"{job_id}.payload").unlink(missing_ok=True)
+
+    db.execute(
+        "UPDATE jobs SET status = ?, message = ?, finished_at = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END WHERE id = ?",
+        (status, message, time.time(), status, job_id)
+    )
+
+
+def _beat(db):
+    db.execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)", (os.getpid(), time.time()))
+
+
+def _heartbeat(root, stop):
+    # Keeps this worker's row fresh, including while a long job is running
+    with _connect(root) as db:
+        while not stop.wait(HEARTBEAT_SECONDS):
+            _beat(db)
+
+
+def work(root, parent_pid):
+    # Worker process loop: run queued jobs one at a time until the dashboard
+    # server that started this worker goes away
+    root = Path(root)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(root, stop), daemon=True)
+    with _connect(root) as db:
+        _beat(db)
+        heartbeat.start()
+        try:
+            while os.getppid() == parent_pid:
+                claimed = _claim_next(db)
+                if claimed is None:
+                    time.sleep(POLL_SECONDS)
+                    continue
+                _run_job(root, db, *claimed)
+        finally:
+            stop.set()
+            heartbeat.join()
+            db.execute("DELETE FROM workers WHERE pid = ?", (os.getpid(),))
+
+
+class JobQueue:
+    # Local job queue: job state lives in SQLite and payloads/results in
+    # pickle files next to it, so jobs and their results outlive reruns,
+    # sessions and server restarts. A pool of worker processes pulls queued
+    # jobs from the table. Workers run this file as a script rather than
+    # through multiprocessing, which would re-execute the Streamlit app
+    # (registered as __main__) in every child.
+    #
+    # Workers register in the workers table and heartbeat from a thread.
+    # The pool is whatever live workers are registered, so a second JobQueue
+    # on the same directory (cache clear, hot reload) tops the pool up rather
+    # than starting another, and only jobs whose worker has died are failed.
+
+    def __init__(self, root=JOBS_DIR, max_workers=MAX_WORKERS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self._workers = []
+        self._lock = threading.Lock()
+        with _connect(self.root) as db:
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if 'worker_pid' not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN worker_pid INTEGER")
+        self._maintain()
+        atexit.register(self.shutdown)
+
+    def _maintain(self):
+        # Reap dead workers, fail the jobs they held and start replacements
+        with self._lock, _connect(self.root) as db:
+            dead = [worker.pid for worker in self._workers if worker.poll() is not None]
+            self._workers = [worker for worker in self._workers if worker.returncode is None]
+            db.executemany("DELETE FROM workers WHERE pid = ?", [(pid,) for pid in dead])
+            db.execute("DELETE FROM workers WHERE heartbeat < ?", (time.time() - HEARTBEAT_TIMEOUT,))
+
+            registered = {pid for pid, in db.execute("SELECT pid FROM workers")}
+            # Started by us but not yet registered: still starting up, not dead
+            starting = {worker.pid for worker in self._workers} - registered
+            # Workers register before claiming anything, so a running job whose
+            # worker is not registered has lost its worker
+            db.execute(
+                "UPDATE jobs SET status = 'failed', message = 'Worker stopped unexpectedly', finished_at = ? "
+                "WHERE status = 'running' AND (worker_pid IS NULL OR worker_pid NOT IN (SELECT pid FROM workers))",
+                (time.time(),)
+            )
+
+            for _ in range(self.max_workers - len(registered | starting)):
+                self._workers.append(subprocess.Popen(
+                    [sys.executable, str(Path(__file__).resolve()), str(self.root), str(os.getpid())]
+                ))
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.terminate()
+
+    def submit(self, kind, payload, label):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._maintain()
+        job_id = uuid.uuid4().hex[:12]
+        (self.root / f"{job_id}.payload").write_bytes(pickle.dumps(payload))
+        with _connect(self.root) as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, label, created_at, message) VALUES (?, ?, ?, ?, 'Queued')",
+                (job_id, kind, label, time.time())
+            )
+        return job_id
+
+    def cancel(self, job_id):
+        # Queued jobs are cancelled outright; running ones stop at their next progress report
+        with _connect(self.root) as db:
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+
+    def jobs(self):
+        self._maintain()
+        with _connect(self.root) as db:
+            return pd.read_sql_query("SELECT * FROM jobs ORDER BY created_at DESC", db)
+
+    def result(self, job_id):
+        path = self.root / f"{job_id}.result"
+        return pickle.loads(path.read_bytes()) if path.exists() else None
+
+    def clear_finished(self):
+        with _connect(self.root) as db:
+            finished = [job_id for job_id, in db.execute(
+                f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))})", FINISHED
+            )]
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in finished])
+        for job_id in finished:
+            (self.root / f"{job_id}.result").unlink(missing_ok=True)
+            (self.root / f"{job_id}.payload").unlink(missing_ok=True)
+        return len(finished)
+
+
+if __name__ == "__main__":
+    work(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pandas as pd
+
+# Columns of an archived quote record (one row per quote)
+STUDY_KEYS = ['load_flow', 'short_circuit', 'pdc', 'arc_flash']
+
+QUOTE_COLUMNS = [
+    'project_name', 'it_capacity', 'mechanical_load', 'house_load', 'total_load',
+    'tier_level', 'estimated_buses', *STUDY_KEYS,
+    'senior_allocation', 'mid_allocation', 'junior_allocation',
+    'delivery_type', 'custom_margin', 'total_study_hours', 'total_cost',
+]
+
+# Filled in after project close-out; optional in uploaded archives
+OPTIONAL_COLUMNS = ['actual_cost']
+
+TIER_LEVELS = {"Tier I": 1, "Tier II": 2, "Tier III": 3, "Tier IV": 4}
+
+# Accepted spellings of a study flag (matched case-insensitively)
+STUDY_FLAGS = {'true': True, 'false': False, 'yes': True, 'no': False,
+               '1': True, '0': False, '1.0': True, '0.0': False}
+
+# Quotes added from the dashboard, kept alongside any uploaded archive
+ADDED_QUOTES_PATH = Path(__file__).parent / ".archive" / "added_quotes.csv"
+
+
+def quote_record(**fields):
+    # Single-row frame in archive schema for the quote currently on screen
+    missing = [col for col in QUOTE_COLUMNS if col not in fields]
+    if missing:
+        raise ValueError(f"Quote record is missing fields: {', '.join(missing)}")
+    return pd.DataFrame([{col: fields[col] for col in QUOTE_COLUMNS + OPTIONAL_COLUMNS if col in fields}])
+
+
+def load_quotes(source):
+    # Read a quote archive CSV and coerce it to the archive schema
+    quotes = pd.read_csv(source)
+    missing = [col for col in QUOTE_COLUMNS if col not in quotes.columns]
+    if missing:
+        raise ValueError(f"Quote archive is missing columns: {', '.join(missing)}")
+
+    for col in STUDY_KEYS:
+        if quotes[col].dtype == bool:
+            continue
+        flags = quotes[col].astype(str).str.strip().str.lower().map(STUDY_FLAGS)
+        unrecognized = flags.isna()
+        if unrecognized.any():
+            values = quotes.loc[unrecognized, col].fillna("").astype(str).unique()
+            shown = ", ".join(repr(value) if value else "blank" for value in values[:5])
+            raise ValueError(f"Quote archive has {int(unrecognized.sum())} rows with an unrecognized {col} flag ({shown})")
+        quotes[col] = flags.astype(bool)
+    unknown_tiers = ~quotes['tier_level'].isin(TIER_LEVELS)
+    if unknown_tiers.any():
+        raise ValueError(f"Quote archive has {int(unknown_tiers.sum())} rows with an unknown tier_level")
+    if 'actual_cost' not in quotes.columns:
+        quotes['actual_cost'] = float('nan')
+    return quotes.reset_index(drop=True)
+
+
+def load_added_quotes(path=ADDED_QUOTES_PATH):
+    return load_quotes(path) if Path(path).exists() else None
+
+
+def append_quotes(quotes, path=ADDED_QUOTES_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Fixed column order so appended rows always line up with the header
+    quotes.reindex(columns=QUOTE_COLUMNS + OPTIONAL_COLUMNS).to_csv(
+        path, mode='a', header=not path.exists(), index=False
+    )
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from quotes import STUDY_KEYS
+
+# Absolute sanity thresholds for a quote
+COST_PER_MW_RANGE = (10_000, 200_000)   # ₹ per MW of total load
+HOURS_PER_BUS_RANGE = (0.5, 12.0)       # study hours per estimated bus
+MIN_SENIOR_SHARE = 0.10
+MAX_JUNIOR_SHARE = 0.70
+MIN_URGENT_MARGIN = 10                  # % margin expected on urgent delivery
+
+# Percentile bands computed from quote history, per tier level
+BAND_PERCENTILES = (5, 95)
+BAND_METRICS = ['cost_per_mw', 'hours_per_bus']
+MIN_BAND_SAMPLES = 20
+
+RULES = {
+    'no_studies': "No studies selected",
+    'cost_per_mw_low': "Cost per MW below ₹{:,.0f}".format(COST_PER_MW_RANGE[0]),
+    'cost_per_mw_high': "Cost per MW above ₹{:,.0f}".format(COST_PER_MW_RANGE[1]),
+    'hours_per_bus_low': f"Fewer than {HOURS_PER_BUS_RANGE[0]} study hours per bus",
+    'hours_per_bus_high': f"More than {HOURS_PER_BUS_RANGE[1]} study hours per bus",
+    'thin_senior_cover': f"Senior allocation below {MIN_SENIOR_SHARE:.0%}",
+    'junior_heavy': f"Junior allocation above {MAX_JUNIOR_SHARE:.0%}",
+    'urgent_thin_margin': f"Urgent delivery quoted under {MIN_URGENT_MARGIN}% margin",
+    'cost_per_mw_outlier': "Cost per MW outside the {}th–{}th percentile of past {} quotes",
+    'hours_per_bus_outlier': "Hours per bus outside the {}th–{}th percentile of past {} quotes",
+}
+
+
+def quote_metrics(quotes):
+    # Derived per-quote ratios the rules are evaluated on
+    total_load = quotes['total_load'].to_numpy(dtype=float)
+    buses = quotes['estimated_buses'].to_numpy(dtype=float)
+    allocation = quotes[['senior_allocation', 'mid_allocation', 'junior_allocation']].to_numpy(dtype=float)
+    allocation_total = allocation.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'cost_per_mw': np.where(total_load > 0, quotes['total_cost'].to_numpy(dtype=float) / total_load, np.nan),
+            'hours_per_bus': np.where(buses > 0, quotes['total_study_hours'].to_numpy(dtype=float) / buses, np.nan),
+            'senior_share': allocation[:, 0] / allocation_total,
+            'junior_share': allocation[:, 2] / allocation_total,
+        }, index=quotes.index)
+
+
+def percentile_bands(history):
+    # Low/high percentile of each band metric, per tier level, plus the
+    # number of past quotes they were computed from.
+    # Tiers with too few past quotes fall back to the band over all tiers.
+    if len(history) < MIN_BAND_SAMPLES:
+        return None
+
+    metrics = quote_metrics(history)
+    metrics['tier_level'] = history['tier_level'].to_numpy()
+    quantiles = [p / 100 for p in BAND_PERCENTILES]
+
+    overall = metrics[BAND_METRICS].quantile(quantiles)
+    grouped = metrics.groupby('tier_level')
+    per_tier = grouped[BAND_METRICS].quantile(quantiles).unstack()
+    enough = grouped.size() >= MIN_BAND_SAMPLES
+    per_tier = per_tier[enough.reindex(per_tier.index, fill_value=False)]
+
+    bands = {'samples': len(history)}
+    for metric in BAND_METRICS:
+        bands[metric] = {
+            'low': per_tier[(metric, quantiles[0])] if len(per_tier) else pd.Series(dtype=float),
+            'high': per_tier[(metric, quantiles[1])] if len(per_tier) else pd.Series(dtype=float),
+            'default': (overall.loc[quantiles[0], metric], overall.loc[quantiles[1], metric]),
+        }
+    return bands
+
+
+def screen_quotes(quotes, history=None, bands=None):
+    # Evaluate every rule over the whole frame at once. Returns one boolean
+    # column per rule plus flag_count and a readable flag_summary.
+    # Pass bands from percentile_bands(history) when screening in chunks.
+    metrics = quote_metrics(quotes)
+    cost_per_mw = metrics['cost_per_mw'].to_numpy()
+    hours_per_bus = metrics['hours_per_bus'].to_numpy()
+    urgent = quotes['delivery_type'].to_numpy() == "Urgent"
+    margin = quotes['custom_margin'].to_numpy(dtype=float)
+
+    flags = pd.DataFrame({
+        'no_studies': ~quotes[STUDY_KEYS].to_numpy(dtype=bool).any(axis=1),
+        'cost_per_mw_low': cost_per_mw < COST_PER_MW_RANGE[0],
+        'cost_per_mw_high': cost_per_mw > COST_PER_MW_RANGE[1],
+        'hours_per_bus_low': hours_per_bus < HOURS_PER_BUS_RANGE[0],
+        'hours_per_bus_high': hours_per_bus > HOURS_PER_BUS_RANGE[1],
+        'thin_senior_cover': metrics['senior_share'].to_numpy() < MIN_SENIOR_SHARE,
+        'junior_heavy': metrics['junior_share'].to_numpy() > MAX_JUNIOR_SHARE,
+        'urgent_thin_margin': urgent & (margin < MIN_URGENT_MARGIN),
+    }, index=quotes.index)
+
+    if bands is None and history is not None:
+        bands = percentile_bands(history)
+    if bands is not None:
+        tiers = quotes['tier_level']
+        for metric, values in (('cost_per_mw', cost_per_mw), ('hours_per_bus', hours_per_bus)):
+            band = bands[metric]
+            low = tiers.map(band['low']).fillna(band['default'][0]).to_numpy(dtype=float)
+            high = tiers.map(band['high']).fillna(band['default'][1]).to_numpy(dtype=float)
+            flags[f'{metric}_outlier'] = (values < low) | (values > high)
+    else:
+        flags['cost_per_mw_outlier'] = False
+        flags['hours_per_bus_outlier'] = False
+
+    rule_keys = list(RULES)
+    flag_matrix = flags[rule_keys].to_numpy()
+    flags['flag_count'] = flag_matrix.sum(axis=1)
+
+    # Build one message per distinct combination of rules, not per row
+    summary = np.full(len(flags), "", dtype=object)
+    flagged_rows = np.flatnonzero(flags['flag_count'].to_numpy())
+    if len(flagged_rows):
+        samples = 0 if bands is None else bands['samples']
+        messages = np.array([rule_message(key, samples) for key in rule_keys], dtype=object)
+        bits = 1 << np.arange(len(rule_keys), dtype=np.int64)
+        codes = flag_matrix[flagged_rows].astype(np.int64) @ bits
+        patterns, inverse = np.unique(codes, return_inverse=True)
+        pattern_text = np.array(
+            ["; ".join(messages[(code & bits) > 0]) for code in patterns], dtype=object
+        )
+        summary[flagged_rows] = pattern_text[inverse]
+    flags['flag_summary'] = summary
+    return flags
+
+
+def flagged_report(quotes, flags):
+    # Flagged quotes with their reasons, worst first
+    flagged = flags['flag_count'] > 0
+    return quotes.loc[flagged, ['project_name', 'tier_level', 'total_load', 'total_cost']].assign(
+        flags=flags.loc[flagged, 'flag_count'],
+        reasons=flags.loc[flagged, 'flag_summary']
+    ).sort_values('flags', ascending=False, kind='stable')
+
+
+def rule_message(key, samples=0):
+    message = RULES[key]
+    if key.endswith('_outlier'):
+        return message.format(*BAND_PERCENTILES, f"{samples:,}")
+    return message